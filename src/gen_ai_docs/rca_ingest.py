@@ -0,0 +1,372 @@
+# ............................................................
+# Incremental RCA corpus ingestion
+# ............................................................
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from google.cloud import bigquery
+
+os.environ["GRPC_VERBOSITY"] = "NONE"
+
+SOURCES = ["incidents", "pdfs"]
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_BATCH_SIZE = 100
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_text(
+    text: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> List[str]:
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    if not text.strip():
+        return []
+    if len(text) <= chunk_size:
+        return [text]
+    step = chunk_size - chunk_overlap
+    chunks = [
+        text[start : start + chunk_size]
+        for start in range(0, len(text) - chunk_overlap, step)
+    ]
+    # Blank chunks carry nothing to embed
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+# .... Embedders
+
+
+class Embedder(Protocol):
+    name: str
+
+    def embed(self, texts: List[str]) -> List[List[float]]: ...
+
+
+class HashingEmbedder:
+    # Local deterministic stand-in: signed feature hashing of the tokens
+
+    def __init__(self, dimensions: int = 768):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(
+                hashlib.sha256(token.encode("utf-8")).digest()[:8], "little"
+            )
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+
+class BigQueryEmbedder:
+    def __init__(self, model_fqn: str):
+        self.model_fqn = model_fqn
+        self.name = f"bigquery-{model_fqn}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        client = bigquery.Client()
+        sql = f"""
+            SELECT content, ml_generate_embedding_result, ml_generate_embedding_status
+            FROM ML.GENERATE_EMBEDDING(
+              MODEL `{self.model_fqn}`,
+              (SELECT content FROM UNNEST(@contents) AS content))
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("contents", "STRING", texts)]
+        )
+        df = client.query_and_wait(sql, job_config=job_config).to_dataframe()
+        failed = df[df["ml_generate_embedding_status"].str.len() > 0]
+        if len(failed) > 0:
+            raise RuntimeError(
+                f"Embedding failed for {len(failed)} chunks: {failed['ml_generate_embedding_status'].iloc[0]}"
+            )
+        embeddings = dict(zip(df["content"], df["ml_generate_embedding_result"]))
+        return [list(embeddings[text]) for text in texts]
+
+
+# .... Manifest
+
+
+def manifest_path_for(source: str) -> str:
+    return f"rca_manifest_{source}.json"
+
+
+def load_manifest(manifest_path: str) -> dict:
+    if not os.path.exists(manifest_path):
+        return {"documents": {}}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, manifest_path: str):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def chunk_id(doc_id: str, chunk_hash: str) -> str:
+    return f"{doc_id}:{chunk_hash[:16]}"
+
+
+def refresh_corpus(
+    documents: Dict[str, str],
+    embedder: Embedder,
+    source: str,
+    manifest_path: Optional[str] = None,
+    sink: Optional[Callable[[pd.DataFrame, List[str]], None]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Tuple[pd.DataFrame, List[str]]:
+    """Chunks and embeds only the new or changed content of the corpus.
+
+    documents maps a document id (title) to its text. Each source keeps its
+    own manifest, since documents missing from the input are deleted. Returns
+    the chunk rows to upsert and the chunk ids to delete; when a sink is given
+    it receives both before the manifest is saved.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source '{source}', expected one of {SOURCES}")
+    manifest_path = manifest_path or manifest_path_for(source)
+    manifest = load_manifest(manifest_path)
+    if manifest.get("source", source) != source:
+        raise ValueError(
+            f"Manifest {manifest_path} was built from source '{manifest['source']}', not '{source}'"
+        )
+    settings = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedder": embedder.name,
+    }
+    if manifest.get("settings") != settings:
+        # Chunks or vectors from other settings are not comparable, start over
+        previous = manifest["documents"]
+        manifest = {"source": source, "settings": settings, "documents": {}}
+        deleted = [
+            chunk_id(doc_id, chunk_hash)
+            for doc_id, entry in previous.items()
+            for chunk_hash in entry["chunks"]
+        ]
+    else:
+        deleted = []
+
+    new_chunks = []
+    for doc_id, text in documents.items():
+        doc_hash = content_hash(text)
+        entry = manifest["documents"].get(doc_id)
+        if entry is not None and entry["hash"] == doc_hash:
+            continue
+        previous_hashes = set(entry["chunks"]) if entry is not None else set()
+        chunks = {}
+        for chunk in chunk_text(text, chunk_size, chunk_overlap):
+            chunks.setdefault(content_hash(chunk), chunk)
+        new_chunks += [
+            (doc_id, chunk_hash, chunk)
+            for chunk_hash, chunk in chunks.items()
+            if chunk_hash not in previous_hashes
+        ]
+        deleted += [chunk_id(doc_id, h) for h in previous_hashes.difference(chunks)]
+        manifest["documents"][doc_id] = {"hash": doc_hash, "chunks": list(chunks)}
+
+    for doc_id in set(manifest["documents"]).difference(documents):
+        deleted += [
+            chunk_id(doc_id, h) for h in manifest["documents"].pop(doc_id)["chunks"]
+        ]
+
+    embeddings = []
+    for start in range(0, len(new_chunks), batch_size):
+        batch = new_chunks[start : start + batch_size]
+        embeddings += embedder.embed([chunk for _, _, chunk in batch])
+    upserts = pd.DataFrame(
+        {
+            "chunk_id": [chunk_id(d, h) for d, h, _ in new_chunks],
+            "source": source,
+            "title": [d for d, _, _ in new_chunks],
+            "chunk_hash": [h for _, h, _ in new_chunks],
+            "content": [chunk for _, _, chunk in new_chunks],
+            "ml_generate_embedding_result": embeddings,
+        }
+    )
+    print(
+        f"{len(documents)} documents, {len(upserts)} chunks to embed, {len(deleted)} chunks to delete"
+    )
+
+    if sink is not None:
+        sink(upserts, deleted)
+    save_manifest(manifest, manifest_path)
+    return upserts, deleted
+
+
+# .... BigQuery sources and sink
+
+
+def load_resolution_documents(table_fqn: str) -> Dict[str, str]:
+    client = bigquery.Client()
+    sql = f"""
+        SELECT CONCAT(incident_name, ' ', CAST(start_time AS STRING)) AS title,
+        resolution_description
+        FROM `{table_fqn}`
+        WHERE resolution_description IS NOT NULL
+    """
+    df = client.query_and_wait(sql).to_dataframe()
+    return dict(zip(df["title"], df["resolution_description"]))
+
+
+def load_parsed_documents(table_fqn: str) -> Dict[str, str]:
+    client = bigquery.Client()
+    sql = f"""
+        SELECT uri AS title, JSON_VALUE(ml_process_document_result, '$.text') AS content
+        FROM `{table_fqn}`
+    """
+    df = client.query_and_wait(sql).to_dataframe().dropna(subset=["content"])
+    return dict(zip(df["title"], df["content"]))
+
+
+def bigquery_sink(
+    table_fqn: str, source: str
+) -> Callable[[pd.DataFrame, List[str]], None]:
+    def upsert(upserts: pd.DataFrame, deleted: List[str]):
+        client = bigquery.Client()
+        client.query_and_wait(
+            f"""
+            CREATE TABLE IF NOT EXISTS `{table_fqn}` (
+              chunk_id STRING,
+              source STRING,
+              title STRING,
+              chunk_hash STRING,
+              content STRING,
+              ml_generate_embedding_result ARRAY<FLOAT64>
+            )"""
+        )
+        if deleted:
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter("source", "STRING", source),
+                    bigquery.ArrayQueryParameter("deleted", "STRING", deleted),
+                ]
+            )
+            client.query_and_wait(
+                f"""
+                DELETE FROM `{table_fqn}`
+                WHERE source = @source AND chunk_id IN UNNEST(@deleted)""",
+                job_config=job_config,
+            )
+        if len(upserts) > 0:
+            staging_fqn = f"{table_fqn}_staging"
+            job = client.load_table_from_dataframe(
+                upserts,
+                staging_fqn,
+                job_config=bigquery.LoadJobConfig(write_disposition="WRITE_TRUNCATE"),
+            )
+            job.result()
+            client.query_and_wait(
+                f"""
+                MERGE `{table_fqn}` T
+                USING `{staging_fqn}` S
+                ON T.source = S.source AND T.chunk_id = S.chunk_id
+                WHEN MATCHED THEN UPDATE SET
+                  title = S.title,
+                  chunk_hash = S.chunk_hash,
+                  content = S.content,
+                  ml_generate_embedding_result = S.ml_generate_embedding_result
+                WHEN NOT MATCHED THEN INSERT ROW"""
+            )
+            client.delete_table(staging_fqn, not_found_ok=True)
+
+    return upsert
+
+
+if __name__ == "__main__":
+    import toml
+
+    with open("../config.toml", "r") as f:
+        constants = toml.load(f)
+
+    GOOGLE_CLOUD_BIGQUERY_PROJECT = constants["BIGQUERY"][
+        "GOOGLE_CLOUD_BIGQUERY_PROJECT"
+    ]
+    GOOGLE_CLOUD_BIGQUERY_DATASET = constants["BIGQUERY"][
+        "GOOGLE_CLOUD_BIGQUERY_DATASET"
+    ]
+    GOOGLE_CLOUD_BIGQUERY_DATASET_MULTI_REGION = constants["BIGQUERY"][
+        "GOOGLE_CLOUD_BIGQUERY_DATASET_MULTI_REGION"
+    ]
+    BASE_TABLE_NAME_INCIDENTS = constants["BIGQUERY"]["BASE_TABLE_NAME_INCIDENTS"]
+
+    parser = argparse.ArgumentParser(
+        description="Incrementally chunk and embed the RCA corpus."
+    )
+    parser.add_argument(
+        "--source",
+        choices=SOURCES,
+        default="incidents",
+        help="Read resolution_description from the incidents table, or the parsed PDFs table.",
+    )
+    parser.add_argument(
+        "--embedder",
+        choices=["bigquery", "local"],
+        default="bigquery",
+        help="Embed with the BigQuery gecko_embedder model, or the local deterministic hashing embedder.",
+    )
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk_overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--manifest_path",
+        type=str,
+        default=None,
+        help="Defaults to rca_manifest_<source>.json, one manifest per source.",
+    )
+
+    args = parser.parse_args()
+    print(f"args: {args}")
+
+    if args.source == "incidents":
+        documents = load_resolution_documents(
+            f"{GOOGLE_CLOUD_BIGQUERY_PROJECT}.{GOOGLE_CLOUD_BIGQUERY_DATASET}.{BASE_TABLE_NAME_INCIDENTS}"
+        )
+    else:
+        documents = load_parsed_documents(
+            f"{GOOGLE_CLOUD_BIGQUERY_PROJECT}.{GOOGLE_CLOUD_BIGQUERY_DATASET_MULTI_REGION}.{BASE_TABLE_NAME_INCIDENTS}_docs_parsed"
+        )
+
+    if args.embedder == "bigquery":
+        embedder = BigQueryEmbedder(
+            f"{GOOGLE_CLOUD_BIGQUERY_PROJECT}.{GOOGLE_CLOUD_BIGQUERY_DATASET_MULTI_REGION}.gecko_embedder"
+        )
+    else:
+        embedder = HashingEmbedder()
+
+    refresh_corpus(
+        documents,
+        embedder,
+        args.source,
+        manifest_path=args.manifest_path,
+        sink=bigquery_sink(
+            f"{GOOGLE_CLOUD_BIGQUERY_PROJECT}.{GOOGLE_CLOUD_BIGQUERY_DATASET_MULTI_REGION}.{BASE_TABLE_NAME_INCIDENTS}_docs_chunks_embedded",
+            args.source,
+        ),
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+    )
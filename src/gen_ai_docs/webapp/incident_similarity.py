@@ -0,0 +1,123 @@
+# ............................................................
+# Similar incident lookup by correlated events
+# ............................................................
+
+import ast
+import numpy as np
+import pandas as pd
+
+from typing import Iterable, List, Optional, Tuple
+
+# Alert events emitted by the network elements, as in TelcoDataGenerator.alerts_events
+ALERTS_EVENTS = [
+    "High Call Drop Rate Alert",
+    "High Temperature Alarm",
+    "Network Congestion Alert",
+    "Equipment Failure Alarm",
+    "Customer Complaints",
+    "Low Signal Strength Warning",
+    "High Packet Loss Alert",
+    "High Latency Alert",
+    "Low Throughput Warning",
+    "High CPU Utilization Warning",
+    "High Memory Utilization Warning",
+    "Low Optical Power Alarm",
+    "Low SNR Margin Warning",
+    "High DNS Query Latency Alert",
+    "High DNS Query Failure Rate Alert",
+    "BGP Peer Down Alert",
+    "High Interface Error Rate Alert",
+    "ONU Offline Alert",
+    "High CRC Error Rate Alert",
+    "Unusual Connection Attempt Rate Alert",
+    "High Blocked Connection Rate Alert",
+    "High Active Connection Count Alert",
+    "High Request Rate Alert",
+    "VPN Tunnel Down Alert",
+    "DoS Attack Suspected",
+    "Unauthorized Access Attempt",
+    "Service Degradation Reported",
+]
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def parse_correlated_events(value) -> List[str]:
+    # correlated_events is stored as a stringified Python list
+    if isinstance(value, str):
+        value = ast.literal_eval(value) if value.strip() else []
+    elif value is None or (isinstance(value, float) and np.isnan(value)):
+        value = []
+    return [event for event in value if event]
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT_TABLE[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+class IncidentSimilarityIndex:
+    """Exact Jaccard top-k over correlated-event sets packed as bitsets.
+
+    Each incident is a row of 64-bit words with one bit per event of the
+    vocabulary (by default ALERTS_EVENTS plus any other event seen in the
+    incidents). Only incidents sharing at least one event with the query
+    are returned.
+    """
+
+    def __init__(
+        self, incidents_df: pd.DataFrame, vocabulary: Optional[Iterable[str]] = None
+    ):
+        self.incidents = incidents_df.reset_index(drop=True)
+        event_sets = [
+            set(parse_correlated_events(value))
+            for value in self.incidents["correlated_events"]
+        ]
+        if vocabulary is None:
+            vocabulary = ALERTS_EVENTS + sorted(set().union(*event_sets))
+        self.vocabulary = list(dict.fromkeys(vocabulary))
+        self.positions = {event: i for i, event in enumerate(self.vocabulary)}
+        self.n_words = max(1, -(-len(self.vocabulary) // 64))
+
+        self.bitsets = np.zeros((len(event_sets), self.n_words), dtype=np.uint64)
+        for row, events in enumerate(event_sets):
+            self.bitsets[row] = self.encode(events)[0]
+        # Set sizes also count events outside the vocabulary, keeping Jaccard exact
+        self.sizes = np.array([len(events) for events in event_sets], dtype=np.int64)
+
+    def encode(self, events: Iterable[str]) -> Tuple[np.ndarray, int]:
+        bitset = np.zeros(self.n_words, dtype=np.uint64)
+        unknown = 0
+        for event in set(events):
+            position = self.positions.get(event)
+            if position is None:
+                unknown += 1
+            else:
+                bitset[position // 64] |= np.uint64(1) << np.uint64(position % 64)
+        return bitset, unknown
+
+    def search(
+        self, events: Iterable[str], top_k: int = 5, min_similarity: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        bitset, unknown = self.encode(events)
+        query_size = int(_popcount(bitset)) + unknown
+        intersection = _popcount(self.bitsets & bitset)
+        union = self.sizes + query_size - intersection
+        # An empty union implies an empty intersection, so the similarity is 0
+        similarity = intersection / np.maximum(union, 1)
+        top_k = min(top_k, len(similarity))
+        if top_k == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        top = np.argpartition(-similarity, top_k - 1)[:top_k]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        top = top[(similarity[top] > 0) & (similarity[top] >= min_similarity)]
+        return top, similarity[top]
+
+    def query(
+        self, events: Iterable[str], top_k: int = 5, min_similarity: float = 0.0
+    ) -> pd.DataFrame:
+        top, similarity = self.search(events, top_k, min_similarity)
+        df = self.incidents.iloc[top].copy()
+        df.insert(0, "similarity", similarity)
+        return df.reset_index(drop=True)
@@ -7,7 +7,10 @@ import pandas as pd
 
 from google.cloud import bigquery
 
+from incident_similarity import IncidentSimilarityIndex
 
+
+GOOGLE_CLOUD_BIGQUERY_DATASET = "rca_data"
 GOOGLE_CLOUD_BIGQUERY_DATASET_MULTI_REGION = "rca_data_us"
 BASE_TABLE_NAME_INCIDENTS = "telco_rca_incidents"
 
@@ -18,11 +21,24 @@ def run_query(query: str) -> pd.DataFrame:
     return df
 
 
+@st.cache_resource
+def load_similarity_index() -> IncidentSimilarityIndex:
+    df_incidents = run_query(
+        f"""SELECT incident_name, start_time, correlated_events, resolution_description
+        FROM `{GOOGLE_CLOUD_BIGQUERY_DATASET}.{BASE_TABLE_NAME_INCIDENTS}`"""
+    )
+    return IncidentSimilarityIndex(df_incidents)
+
+
 # .... App
 
 st.markdown("### Issue diagnosis using Gen AI with BigQuery")
+similarity_index = load_similarity_index()
 with st.form("rag_form"):
     user_query = st.text_input("Enter your problem")
+    firing_alerts = st.multiselect(
+        "Alerts currently firing", similarity_index.vocabulary
+    )
 
     query_search = f"""
         SELECT *
@@ -68,6 +84,13 @@ with st.form("rag_form"):
 
     run_rag = st.form_submit_button("Launch RAG on BQ")
     if run_rag:
+        if firing_alerts:
+            df_similar = similarity_index.query(firing_alerts, top_k=5)
+            if len(df_similar) > 0:
+                st.text("Similar past incidents")
+                st.dataframe(df_similar, use_container_width=True)
+            else:
+                st.text("No past incident shares these alerts")
         df_rag = run_query(query_rag)
         df_search = run_query(query_search)
         st.text("RAG result")
@@ -0,0 +1,174 @@
+# ............................................................
+# Multi-resolution feature engine
+# ............................................................
+
+import os
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence
+
+
+DEFAULT_WINDOW_SIZES = ["5min", "15min", "1h", "1d"]
+
+# Partial aggregates are mergeable: coarser windows are derived from finer
+# ones without going back to the raw events.
+PARTIAL_AGGREGATIONS = {
+    "value_sum": "sum",
+    "value_count": "sum",
+    "max_value": "max",
+    "min_value": "min",
+    "count_events": "sum",
+}
+
+
+def _sort_window_sizes(window_sizes: Sequence[str]) -> List[str]:
+    if not window_sizes:
+        raise ValueError("At least one window size is required")
+    windows = []
+    for window_size in sorted(window_sizes, key=pd.to_timedelta):
+        if pd.to_timedelta(window_size) not in [pd.to_timedelta(w) for w in windows]:
+            windows.append(window_size)
+    # Nested windows: every bucket is the exact union of buckets of the finer window
+    for finer, coarser in zip(windows, windows[1:]):
+        if pd.to_timedelta(coarser) % pd.to_timedelta(finer) != pd.Timedelta(0):
+            raise ValueError(
+                f"Window size {coarser} is not a multiple of the finer window size {finer}"
+            )
+    return windows
+
+
+def _bucket(timestamps, origin: pd.Timestamp, window_size: str):
+    # Same buckets as pd.Grouper(freq=window_size), which starts at the first day
+    window = pd.to_timedelta(window_size)
+    return origin + ((timestamps - origin) // window) * window
+
+
+def _aggregate_partition(
+    df: pd.DataFrame, window_sizes: List[str], origin: pd.Timestamp
+) -> Dict[str, pd.DataFrame]:
+    finest = window_sizes[0]
+    partials = {
+        finest: df.groupby(
+            ["network_element_id", _bucket(df["timestamp"], origin, finest)]
+        ).agg(
+            value_sum=("value", "sum"),
+            value_count=("value", "count"),
+            max_value=("value", "max"),
+            min_value=("value", "min"),
+            count_events=("event", "count"),
+        )
+    }
+    for finer, window_size in zip(window_sizes, window_sizes[1:]):
+        source = partials[finer]
+        timestamps = source.index.get_level_values("timestamp")
+        partials[window_size] = source.groupby(
+            [
+                source.index.get_level_values("network_element_id"),
+                _bucket(timestamps, origin, window_size).rename("timestamp"),
+            ]
+        ).agg(PARTIAL_AGGREGATIONS)
+    return partials
+
+
+def _partition_events(
+    df: pd.DataFrame, partition_by: str, coarsest_window: str, origin: pd.Timestamp
+) -> List[pd.DataFrame]:
+    if partition_by == "network_element":
+        keys = df["network_element_id"]
+    elif partition_by == "time":
+        # Partition on the coarsest window so no window straddles two partitions
+        keys = _bucket(df["timestamp"], origin, coarsest_window)
+    else:
+        raise ValueError(
+            f"Unknown partition_by '{partition_by}', expected 'network_element' or 'time'"
+        )
+    return [partition for _, partition in df.groupby(keys, sort=False)]
+
+
+def _finalize_features(
+    partial: pd.DataFrame, element_ids: Sequence[str]
+) -> pd.DataFrame:
+    partial = partial.sort_index()
+    network_wide = partial.groupby(level="timestamp").agg(PARTIAL_AGGREGATIONS)
+
+    features = pd.DataFrame(
+        {
+            "mean_value": partial["value_sum"] / partial["value_count"],
+            "max_value": partial["max_value"],
+            "min_value": partial["min_value"],
+            "count_events": partial["count_events"],
+        }
+    ).reset_index()
+    network_wide = pd.DataFrame(
+        {
+            "network_mean_value": network_wide["value_sum"]
+            / network_wide["value_count"],
+            "network_max_value": network_wide["max_value"],
+            "network_min_value": network_wide["min_value"],
+            "network_count_events": network_wide["count_events"],
+        }
+    ).reset_index()
+    features = pd.merge(features, network_wide, on="timestamp", how="left")
+
+    # Pairwise mean differences, only populated on the rows of the first element
+    means = features.pivot(
+        index="timestamp", columns="network_element_id", values="mean_value"
+    )
+    mean_diffs = {}
+    for element1, element2 in combinations(element_ids, 2):
+        column = f"mean_diff_{element1}_{element2}"
+        if element1 not in means.columns or element2 not in means.columns:
+            mean_diffs[column] = pd.Series(float("nan"), index=features.index)
+            continue
+        is_element1 = features["network_element_id"] == element1
+        diff = means[element1] - means[element2]
+        mean_diffs[column] = features["timestamp"].map(diff).where(is_element1)
+    features = pd.concat(
+        [features, pd.DataFrame(mean_diffs, index=features.index)], axis=1
+    )
+    return features
+
+
+def create_multi_resolution_features(
+    df: pd.DataFrame,
+    window_sizes: Sequence[str] = DEFAULT_WINDOW_SIZES,
+    partition_by: str = "network_element",
+    max_workers: Optional[int] = None,
+) -> Dict[str, pd.DataFrame]:
+    """Computes the create_features feature set for several window sizes in one pass.
+
+    Returns a dictionary keyed by window size. Window sizes must be nested:
+    each one a multiple of the next finer one (e.g. 5min, 15min, 1h, 1d).
+    Buckets start at midnight of the first day, as with pd.Grouper.
+    """
+    window_sizes = _sort_window_sizes(window_sizes)
+    df = df[["timestamp", "network_element_id", "value", "event"]].copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    element_ids = df["network_element_id"].unique()
+    origin = df["timestamp"].min().normalize()
+
+    partitions = _partition_events(df, partition_by, window_sizes[-1], origin)
+    max_workers = max_workers or min(len(partitions), os.cpu_count() or 1)
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                executor.map(
+                    _aggregate_partition,
+                    partitions,
+                    [window_sizes] * len(partitions),
+                    [origin] * len(partitions),
+                )
+            )
+    else:
+        results = [
+            _aggregate_partition(partition, window_sizes, origin)
+            for partition in partitions
+        ]
+
+    features = {}
+    for window_size in window_sizes:
+        partial = pd.concat([result[window_size] for result in results])
+        features[window_size] = _finalize_features(partial, element_ids)
+    return features
@@ -0,0 +1,250 @@
+# ............................................................
+# Cached, parallel hyperparameter search
+# ............................................................
+
+import os
+import json
+import shutil
+import tempfile
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+from feature_engine import create_multi_resolution_features
+
+
+FEATURE_CACHE_DIR = ".feature_cache"
+
+# Part of every cache key: bump it whenever join_with_incidents, the matrix
+# layout or the feature engine change, so stale matrices are not reused
+FEATURE_VERSION = 1
+
+DEFAULT_PARAM_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 10, 20],
+    "min_samples_leaf": [1, 5],
+}
+
+TARGET = "incident_occurred"
+
+# Feature matrices opened by each worker process, keyed by cache path
+_worker_matrices = {}
+
+
+def data_version(events_df: pd.DataFrame, incidents_df: pd.DataFrame) -> str:
+    digest = hashlib.sha256()
+    for df, columns in [
+        (events_df, ["timestamp", "network_element_id", "value", "event"]),
+        (incidents_df, ["incident_name", "start_time", "end_time"]),
+    ]:
+        digest.update(pd.util.hash_pandas_object(df[columns], index=False).values)
+    return digest.hexdigest()[:16]
+
+
+# Same labelling as join_with_incidents in random_forest_classifier.ipynb and
+# join_features_op, keep the three in sync (and bump FEATURE_VERSION)
+def join_with_incidents(features_df: pd.DataFrame, incidents_df: pd.DataFrame):
+    df = features_df.copy()
+    df["incident_occurred"] = 0
+    for _, row in incidents_df.iterrows():
+        start_time = row["start_time"]
+        end_time = row["end_time"]
+        incident_name = row["incident_name"]
+        matching_features = df[
+            (df["timestamp"] >= start_time) & (df["timestamp"] <= end_time)
+        ]
+
+        df.loc[matching_features.index, "incident_occurred"] = 1
+        df.loc[matching_features.index, "incident_name"] = incident_name
+    return df
+
+
+def _cache_path(cache_dir: str, version: str, window_size: str) -> str:
+    return os.path.join(cache_dir, f"v{FEATURE_VERSION}_{version}_{window_size}")
+
+
+def _is_complete(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "columns.json"))
+
+
+def _write_feature_matrix(path: str, df: pd.DataFrame):
+    df = df.sort_values(["timestamp", "network_element_id"], kind="stable")
+    df["network_element_id"] = LabelEncoder().fit_transform(df["network_element_id"])
+    X = df.drop(columns=[TARGET, "timestamp", "incident_name"], errors="ignore")
+    X = X.fillna(0).astype("float64")
+
+    # Private temporary directory per writer, moved into place once complete
+    cache_dir = os.path.dirname(path) or "."
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=f".{os.path.basename(path)}.")
+    np.save(os.path.join(tmp_path, "X.npy"), X.to_numpy())
+    np.save(os.path.join(tmp_path, "y.npy"), df[TARGET].to_numpy(dtype="int64"))
+    np.save(
+        os.path.join(tmp_path, "timestamps.npy"),
+        pd.to_datetime(df["timestamp"]).astype("int64").to_numpy(),
+    )
+    # Written last, marks the entry as complete
+    with open(os.path.join(tmp_path, "columns.json"), "w") as f:
+        json.dump(list(X.columns), f)
+    if os.path.isdir(path) and not _is_complete(path):
+        shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        if not _is_complete(path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        # Written meanwhile by a concurrent run, same data version so a cache hit
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def build_feature_matrices(
+    events_df: pd.DataFrame,
+    incidents_df: pd.DataFrame,
+    window_sizes: Sequence[str] = ("1h",),
+    cache_dir: str = FEATURE_CACHE_DIR,
+    version: Optional[str] = None,
+) -> Dict[str, str]:
+    """Returns the cache path of the feature matrix of each window size.
+
+    Matrices are keyed on FEATURE_VERSION, the input data version and the
+    window size, so only the missing ones are computed (in a single feature engine pass).
+    """
+    version = version or data_version(events_df, incidents_df)
+    paths = {w: _cache_path(cache_dir, version, w) for w in window_sizes}
+    missing = [w for w, path in paths.items() if not _is_complete(path)]
+    if missing:
+        print(f"Computing features for window sizes {missing} ..")
+        features = create_multi_resolution_features(events_df, missing)
+        for window_size in missing:
+            joined = join_with_incidents(features[window_size], incidents_df)
+            _write_feature_matrix(paths[window_size], joined)
+    return paths
+
+
+def load_feature_matrix(path: str):
+    # Memory-mapped read-only, so worker processes share the same pages
+    if path not in _worker_matrices:
+        _worker_matrices[path] = tuple(
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ["X", "y", "timestamps"]
+        )
+    return _worker_matrices[path]
+
+
+def time_series_folds(
+    timestamps: np.ndarray, n_splits: int
+) -> List[Tuple[slice, slice]]:
+    # Split on distinct timestamps so a window never lands in both train and test
+    unique_timestamps = np.unique(timestamps)
+    folds = []
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(
+        unique_timestamps
+    ):
+        test_start = np.searchsorted(timestamps, unique_timestamps[test_idx[0]])
+        test_end = np.searchsorted(
+            timestamps, unique_timestamps[test_idx[-1]], side="right"
+        )
+        # Rows are sorted by timestamp, so folds are contiguous slices of the memmap
+        folds.append((slice(0, test_start), slice(test_start, test_end)))
+    return folds
+
+
+def _evaluate_configuration(path: str, params: dict, n_splits: int) -> dict:
+    X, y, timestamps = load_feature_matrix(path)
+    start = time.perf_counter()
+    scores = {"accuracy": [], "precision": [], "recall": [], "f1": []}
+    for train_idx, test_idx in time_series_folds(timestamps, n_splits):
+        model = RandomForestClassifier(random_state=42, n_jobs=1, **params)
+        model.fit(X[train_idx], y[train_idx])
+        y_pred = model.predict(X[test_idx])
+        y_test = y[test_idx]
+        scores["accuracy"].append(accuracy_score(y_test, y_pred))
+        scores["precision"].append(precision_score(y_test, y_pred, zero_division=0))
+        scores["recall"].append(recall_score(y_test, y_pred, zero_division=0))
+        scores["f1"].append(f1_score(y_test, y_pred, zero_division=0))
+    result = {metric: float(np.mean(values)) for metric, values in scores.items()}
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def search_hyperparameters(
+    events_df: pd.DataFrame,
+    incidents_df: pd.DataFrame,
+    window_sizes: Sequence[str] = ("1h",),
+    param_grid: Optional[dict] = None,
+    n_splits: int = 5,
+    max_workers: Optional[int] = None,
+    cache_dir: str = FEATURE_CACHE_DIR,
+    version: Optional[str] = None,
+) -> pd.DataFrame:
+    """Cross-validates every window size / hyperparameter combination in parallel.
+
+    Returns one row per configuration with its mean fold metrics and the
+    time spent on it, best F1 first. n_splits is lowered for window sizes
+    with too few distinct windows, and window sizes that cannot be split at
+    all are skipped.
+    """
+    paths = build_feature_matrices(
+        events_df, incidents_df, window_sizes, cache_dir, version
+    )
+    window_splits = {}
+    for window_size in window_sizes:
+        _, _, timestamps = load_feature_matrix(paths[window_size])
+        # TimeSeriesSplit needs n_splits + 1 distinct windows and at least 2 folds
+        max_splits = len(np.unique(timestamps)) - 1
+        if max_splits < 2:
+            print(
+                f"Skipping window size {window_size}: {max_splits + 1} distinct windows, at least 3 are needed"
+            )
+        elif max_splits < n_splits:
+            print(
+                f"Window size {window_size}: using {max_splits} splits instead of {n_splits}"
+            )
+            window_splits[window_size] = max_splits
+        else:
+            window_splits[window_size] = n_splits
+    if not window_splits:
+        raise ValueError(
+            f"None of the window sizes {list(window_sizes)} has enough distinct windows to cross-validate"
+        )
+
+    configurations = [
+        (window_size, params)
+        for window_size in window_splits
+        for params in ParameterGrid(param_grid or DEFAULT_PARAM_GRID)
+    ]
+    print(f"Evaluating {len(configurations)} configurations ..")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                _evaluate_configuration,
+                [paths[window_size] for window_size, _ in configurations],
+                [params for _, params in configurations],
+                [window_splits[window_size] for window_size, _ in configurations],
+            )
+        )
+
+    # Object dtype keeps None and integer grid values as given
+    report = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "window_size": [w for w, _ in configurations],
+                    "n_splits": [window_splits[w] for w, _ in configurations],
+                }
+            ),
+            pd.DataFrame([params for _, params in configurations], dtype=object),
+            pd.DataFrame(results),
+        ],
+        axis=1,
+    )
+    return report.sort_values("f1", ascending=False, ignore_index=True)